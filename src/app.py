@@ -1,17 +1,28 @@
+import logging
+
+from src import config
 from src.etl import run_etl
 from src.kpi import run_kpi
 from src.model import run_model
 from src.evaluation import run_evaluation
 from src.dashboards import run_dashboard
+from src.logutil import LOG_FORMAT
+
+logger = logging.getLogger(__name__)
 
 def main():
-    print("🚀 Iniciando orquestador Fashion Data\n")
+    # Los loggers sin handler propio (app, config.save_figure) propagan
+    # al root: configurarlo aquí hace visibles sus mensajes en consola.
+    # Los módulos con setup_async_logger no se duplican (propagate=False).
+    logging.basicConfig(level=logging.INFO, format=LOG_FORMAT)
+    logger.info("🚀 Iniciando orquestador Fashion Data")
+    config._ensure_dirs()
     run_etl()
     run_kpi()
     run_model()
     run_evaluation()
     run_dashboard()
-    print("\n✅ Pipeline ejecutado con éxito.")
+    logger.info("✅ Pipeline ejecutado con éxito.")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -12,8 +12,13 @@ de logs separada por módulo.
 ==========================================================
 """
 
+import logging
 from pathlib import Path
 import matplotlib.pyplot as plt
+import pandas as pd
+
+# Sin handler propio: propaga al root, que app.main() configura a INFO
+log = logging.getLogger(__name__)
 
 # ==========================================================
 # RUTAS PRINCIPALES
@@ -51,27 +56,45 @@ LOGS_EVAL = LOGS_DIR / "evaluation"
 LOGS_DASH = LOGS_DIR / "dashboard"
 
 # ==========================================================
-# CREAR TODA LA ESTRUCTURA SI NO EXISTE
-# ==========================================================
-for folder in [
-    RAW_DIR,
-    PROCESSED_DIR,
-    REPORT_DIR,
-    MODELS_DIR,
-    NOTEBOOKS_DIR,
-    FIGURES_DIR,
-    FIGURES_ETL,
-    FIGURES_KPI,
-    FIGURES_MODELS,
-    FIGURES_SHAP,
-    LOGS_DIR,
-    LOGS_ETL,
-    LOGS_KPI,
-    LOGS_ML,
-    LOGS_EVAL,
-    LOGS_DASH,
-]:
-    folder.mkdir(parents=True, exist_ok=True)
+# CREAR TODA LA ESTRUCTURA SI NO EXISTE (lazy)
+# ==========================================================
+_DIRS_READY = False
+
+
+def _ensure_dirs() -> None:
+    """
+    Crea la estructura de carpetas del proyecto una única vez por proceso.
+
+    Antes se ejecutaba en cada import de config.py (16 mkdir por proceso,
+    incluyendo subprocesos y colección de pytest); ahora se invoca desde
+    app.main() y de forma perezosa desde save_figure.
+    """
+    global _DIRS_READY
+    if _DIRS_READY:
+        return
+
+    for folder in [
+        RAW_DIR,
+        PROCESSED_DIR,
+        REPORT_DIR,
+        MODELS_DIR,
+        NOTEBOOKS_DIR,
+        FIGURES_DIR,
+        FIGURES_ETL,
+        FIGURES_KPI,
+        FIGURES_MODELS,
+        FIGURES_SHAP,
+        LOGS_DIR,
+        LOGS_ETL,
+        LOGS_KPI,
+        LOGS_ML,
+        LOGS_EVAL,
+        LOGS_DASH,
+    ]:
+        if not folder.exists():
+            folder.mkdir(parents=True, exist_ok=True)
+
+    _DIRS_READY = True
 
 # ==========================================================
 # PARÁMETROS GLOBALES
@@ -93,7 +116,7 @@ REPORT_FIGURES = FIGURES_DIR
 # ==========================================================
 # FUNCIÓN UNIVERSAL PARA GUARDAR FIGURAS (versión final)
 # ==========================================================
-def save_figure(subfolder: str, filename: str, dpi: int = 300) -> None:
+def save_figure(subfolder: str, filename: str, dpi: int = 300, fig=None) -> None:
     """
     Guarda la figura actual de matplotlib en la subcarpeta correspondiente
     dentro de report/figuras/.
@@ -106,7 +129,13 @@ def save_figure(subfolder: str, filename: str, dpi: int = 300) -> None:
         Nombre del archivo (ej: 'fig_sales_trend.png').
     dpi : int
         Resolución del archivo, por defecto 300.
+    fig : matplotlib.figure.Figure | None
+        Figura a guardar. Si se pasa una figura reutilizable, se guarda
+        directamente y NO se cierra (el llamador la sigue usando); si es
+        None se usa la figura actual de pyplot como hasta ahora.
     """
+    _ensure_dirs()
+
     folder_map = {
         "etl": FIGURES_ETL,
         "kpi": FIGURES_KPI,
@@ -123,12 +152,42 @@ def save_figure(subfolder: str, filename: str, dpi: int = 300) -> None:
     output_path = target_folder / filename
 
     try:
-        plt.tight_layout()
-        plt.savefig(output_path, dpi=dpi, bbox_inches="tight")
-        plt.close()
-        print(f"✅ Figura guardada en: {output_path}")
+        if fig is not None:
+            fig.tight_layout()
+            fig.savefig(output_path, dpi=dpi, bbox_inches="tight")
+        else:
+            plt.tight_layout()
+            plt.savefig(output_path, dpi=dpi, bbox_inches="tight")
+            plt.close()
+        log.info("✅ Figura guardada en: %s", output_path)
     except Exception as e:
-        print(f"⚠️ No se pudo guardar la figura '{filename}': {e}")
+        log.warning("⚠️ No se pudo guardar la figura '%s': %s", filename, e)
+
+
+# ==========================================================
+# CARGA DEL DATASET PROCESADO (Parquet con fallback a CSV)
+# ==========================================================
+def load_processed(columns: list | None = None) -> pd.DataFrame:
+    """
+    Carga el dataset limpio desde processed/, prefiriendo Parquet.
+
+    El ETL escribe fashion_sales_clean.parquet junto al CSV; leer el
+    Parquet evita re-inferir tipos y es mucho más rápido. Si el Parquet
+    no existe (corridas antiguas), se usa el CSV como respaldo.
+
+    Parámetros
+    ----------
+    columns : list | None
+        Subconjunto de columnas a cargar (solo aplica al Parquet).
+    """
+    parquet_path = PROCESSED_DIR / "fashion_sales_clean.parquet"
+    csv_path = PROCESSED_DIR / "fashion_sales_clean.csv"
+
+    if parquet_path.exists():
+        return pd.read_parquet(parquet_path, columns=columns)
+
+    df = pd.read_csv(csv_path, engine="pyarrow", usecols=columns)
+    return df
 
 
 # ==========================================================
@@ -17,11 +17,13 @@ Incluye:
 ==========================================================
 """
 
-import logging
 import pandas as pd
 import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
 from pathlib import Path
 from src.config import RAW_DIR, PROCESSED_DIR, LOGS_ETL
+from src.logutil import setup_async_logger
 
 
 # ----------------------------------------------------------
@@ -31,17 +33,55 @@ RAW_FILE = RAW_DIR / "Fashion_Retail_Sales.csv"
 OUTPUT_FILE = PROCESSED_DIR / "fashion_sales_clean.csv"
 LOG_FILE = LOGS_ETL / "etl_log.txt"
 
+# Tabla de traducción precalculada para normalizar encabezados en una sola pasada
+_TRANS = str.maketrans({" ": "_", "(": "", ")": ""})
 
-
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s - [%(levelname)s] - %(message)s",
-    handlers=[
-        logging.FileHandler(LOG_FILE, mode="w", encoding="utf-8"),
-        logging.StreamHandler()
-    ],
-)
-logger = logging.getLogger(__name__)
+# ----------------------------------------------------------
+# Compatibilidad opcional con Numba (binning JIT-compilado)
+# ----------------------------------------------------------
+HAS_NUMBA = False
+try:
+    from numba import njit
+    HAS_NUMBA = True
+except Exception:
+    pass
+
+
+if HAS_NUMBA:
+    @njit(cache=True)
+    def _bin_codes_jit(x, edges):
+        """Asigna códigos de bin en un solo bucle compilado (−1 = fuera de rango)."""
+        n_bins = edges.size - 1
+        out = np.empty(x.size, np.int8)
+        for i in range(x.size):
+            v = x[i]
+            if not (v >= edges[0]) or v > edges[n_bins]:
+                out[i] = -1
+            else:
+                c = 0
+                while c < n_bins - 1 and v > edges[c + 1]:
+                    c += 1
+                out[i] = c
+        return out
+
+
+def _bin_codes(values, edges) -> np.ndarray:
+    """
+    Calcula códigos de bin equivalentes a pd.cut(..., include_lowest=True)
+    sin construir IntervalIndex. Usa Numba si está disponible; si no,
+    cae a una versión vectorizada con np.searchsorted.
+    """
+    x = np.asarray(values, dtype=np.float64)
+    e = np.asarray(edges, dtype=np.float64)
+    if HAS_NUMBA:
+        return _bin_codes_jit(x, e)
+    codes = np.searchsorted(e[1:-1], x, side="left").astype(np.int8)
+    codes[~((x >= e[0]) & (x <= e[-1]))] = -1
+    return codes
+
+
+
+logger = setup_async_logger(LOG_FILE, __name__)
 
 # ----------------------------------------------------------
 # Funciones principales
@@ -51,7 +91,7 @@ def load_data(path: Path) -> pd.DataFrame:
     logger.info("Cargando dataset desde: %s", path)
     if not path.exists():
         raise FileNotFoundError(f"No se encontró el archivo: {path}")
-    df = pd.read_csv(path)
+    df = pd.read_csv(path, engine="pyarrow")
     logger.info("Dataset cargado correctamente: %d filas, %d columnas", *df.shape)
     return df
 
@@ -60,36 +100,33 @@ def clean_data(df: pd.DataFrame) -> pd.DataFrame:
     """Limpieza y normalización de datos crudos."""
     logger.info("Iniciando limpieza básica de datos...")
 
-    # Normalizar nombres de columnas
-    df.columns = (
-        df.columns.str.strip()
-        .str.lower()
-        .str.replace(" ", "_")
-        .str.replace("(", "", regex=False)
-        .str.replace(")", "", regex=False)
-    )
+    # Normalizar nombres de columnas (una sola pasada con str.translate)
+    df.columns = [c.strip().lower().translate(_TRANS) for c in df.columns]
 
     # Eliminar duplicados
     dup_count = df.duplicated().sum()
     df = df.drop_duplicates()
     logger.info("Duplicados eliminados: %d", dup_count)
 
-    # Imputar valores nulos
+    # Imputar valores nulos (asignación directa, sin inplace deprecado)
     if "purchase_amount_usd" in df.columns:
-        df["purchase_amount_usd"].fillna(df["purchase_amount_usd"].median(), inplace=True)
+        med = df["purchase_amount_usd"].median()
+        df["purchase_amount_usd"] = df["purchase_amount_usd"].fillna(med)
     if "review_rating" in df.columns:
-        df["review_rating"].fillna(df["review_rating"].median(), inplace=True)
+        med = df["review_rating"].median()
+        df["review_rating"] = df["review_rating"].fillna(med)
 
     # Normalizar texto
     for col in ["item_purchased", "payment_method"]:
         if col in df.columns:
             df[col] = df[col].astype(str).str.title().str.strip()
 
-    # Convertir fechas
+    # Convertir fechas con el kernel vectorizado de PyArrow
+    # (error_is_null=True equivale a errors="coerce" de pd.to_datetime)
     if "date_purchase" in df.columns:
-        df["date_purchase"] = pd.to_datetime(
-            df["date_purchase"], format="%d-%m-%Y", errors="coerce"
-        )
+        arr = pa.array(df["date_purchase"].astype(str))
+        parsed = pc.strptime(arr, format="%d-%m-%Y", unit="ms", error_is_null=True)
+        df["date_purchase"] = parsed.to_pandas()
 
     return df
 
@@ -100,25 +137,24 @@ def feature_engineering(df: pd.DataFrame) -> pd.DataFrame:
 
     if "date_purchase" in df.columns:
         df["purchase_year"] = df["date_purchase"].dt.year
-        df["purchase_month"] = df["date_purchase"].dt.month_name()
+        # Mes como entero pequeño (1-12): columna ~12× más chica que el
+        # nombre del mes y sin recasting a Categorical aguas abajo
+        df["purchase_month"] = df["date_purchase"].dt.month.astype("Int8")
         df["purchase_day"] = df["date_purchase"].dt.day
         df["purchase_weekday"] = df["date_purchase"].dt.day_name()
 
-    # Segmentación de ticket
+    # Segmentación de ticket (binning directo, sin IntervalIndex de pd.cut)
     if "purchase_amount_usd" in df.columns:
-        bins = [0, 100, 500, 1000, 5000]
-        labels = ["Bajo", "Medio", "Alto", "Premium"]
-        df["ticket_segment"] = pd.cut(
-            df["purchase_amount_usd"], bins=bins, labels=labels, include_lowest=True
+        codes = _bin_codes(df["purchase_amount_usd"].to_numpy(), [0, 100, 500, 1000, 5000])
+        df["ticket_segment"] = pd.Categorical.from_codes(
+            codes, ["Bajo", "Medio", "Alto", "Premium"]
         )
 
     # Nivel de satisfacción
     if "review_rating" in df.columns:
-        df["satisfaction_level"] = pd.cut(
-            df["review_rating"],
-            bins=[0, 2, 3.5, 5],
-            labels=["Baja", "Media", "Alta"],
-            include_lowest=True,
+        codes = _bin_codes(df["review_rating"].to_numpy(), [0, 2, 3.5, 5])
+        df["satisfaction_level"] = pd.Categorical.from_codes(
+            codes, ["Baja", "Media", "Alta"]
         )
 
     return df
@@ -127,7 +163,8 @@ def feature_engineering(df: pd.DataFrame) -> pd.DataFrame:
 def quality_report(df: pd.DataFrame) -> None:
     """Genera un resumen de calidad del dataset."""
     logger.info("Generando resumen de calidad...")
-    nulos = df.isnull().sum()
+    # df.count() evita materializar la máscara booleana completa de isnull()
+    nulos = len(df) - df.count()
     tipos = df.dtypes
 
     if nulos.any():
@@ -137,10 +174,18 @@ def quality_report(df: pd.DataFrame) -> None:
 
 
 def save_clean_data(df: pd.DataFrame, path: Path) -> None:
-    """Guarda el dataset procesado."""
+    """Guarda el dataset procesado en CSV y Parquet."""
     df.to_csv(path, index=False)
     logger.info("Archivo limpio guardado en: %s", path)
 
+    # Copia Parquet para lecturas rápidas aguas abajo (kpi, evaluation, dashboards)
+    parquet_path = path.with_suffix(".parquet")
+    try:
+        df.to_parquet(parquet_path, compression="zstd", index=False)
+        logger.info("Copia Parquet guardada en: %s", parquet_path)
+    except Exception as e:
+        logger.warning("No se pudo guardar la copia Parquet: %s", e)
+
 
 # ----------------------------------------------------------
 # Función principal del pipeline
@@ -6,105 +6,109 @@ Versión: 1.8 (rutas ML corregidas + consistencia figuras)
 ==========================================================
 """
 
-import logging
 import warnings
+from collections import Counter
 from pathlib import Path
+import numpy as np
 import pandas as pd
 import seaborn as sns
 import matplotlib.pyplot as plt
 from src.config import PROCESSED_DIR, save_figure, LOGS_EVAL
+from src.logutil import setup_async_logger
 
 # ----------------------------------------------------------
 # Configuración general
 # ----------------------------------------------------------
 LOG_FILE = LOGS_EVAL / "evaluation_log.txt"
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s - [%(levelname)s] - %(message)s",
-    handlers=[
-        logging.FileHandler(LOG_FILE, mode="w", encoding="utf-8"),
-        logging.StreamHandler()
-    ]
-)
-logger = logging.getLogger(__name__)
+logger = setup_async_logger(LOG_FILE, __name__)
 
 # Evitar mensajes de Matplotlib sobre "categorical units"
 warnings.filterwarnings("ignore", message="Using categorical units")
 warnings.filterwarnings("ignore", category=UserWarning, module="matplotlib")
 
-sns.set(style="whitegrid", palette="crest", context="talk")
+# Tema aplicado por gráfico vía plt.rc_context: evita mutar rcParams
+# globales en el import (y el escaneo de fuentes en arranque frío)
+_THEME = {**sns.axes_style("whitegrid"), **sns.plotting_context("talk")}
+
+# Figura reutilizable: evita crear/destruir una Figure por gráfico
+_FIG, _AX = plt.subplots(figsize=(8, 4))
 
 # ----------------------------------------------------------
 # Gráficos de ETL
 # ----------------------------------------------------------
 def plot_etl_quality() -> None:
-    """Genera gráficos de calidad de datos del ETL."""
+    """
+    Genera gráficos de calidad de datos del ETL.
+
+    Agrega histograma y conteos en streaming (chunks de 50k filas):
+    la memoria queda acotada aunque el dataset limpio crezca más
+    que la RAM disponible.
+    """
     path = PROCESSED_DIR / "fashion_sales_clean.csv"
     if not path.exists():
         logger.warning("⚠️ No se encontró fashion_sales_clean.csv.")
         return
 
-    df = pd.read_csv(path)
-
-    if "purchase_amount_usd" in df.columns:
-        plt.figure(figsize=(8, 4))
-        sns.histplot(df["purchase_amount_usd"], bins=30, kde=True)
-        plt.title("Distribución del Monto de Compra (USD)")
-        plt.xlabel("Monto de compra (USD)")
-        plt.ylabel("Frecuencia")
-        plt.tight_layout()
-        save_figure("etl", "fig_purchase_distribution.png")
-
-    if "payment_method" in df.columns:
-        plt.figure(figsize=(8, 5))
-        sns.countplot(
-            y="payment_method",
-            data=df,
-            order=df["payment_method"].value_counts().index
-        )
-        plt.title("Frecuencia de Métodos de Pago")
-        plt.xlabel("Cantidad de transacciones")
-        plt.ylabel("Método de pago")
-        plt.tight_layout()
-        save_figure("etl", "fig_payment_methods.png")
+    bins = np.linspace(0, 5000, 31)
+    hist = np.zeros(len(bins) - 1)
+    payment_counter: Counter = Counter()
+
+    for chunk in pd.read_csv(
+        path, chunksize=50_000, usecols=["purchase_amount_usd", "payment_method"]
+    ):
+        hist += np.histogram(chunk["purchase_amount_usd"].dropna(), bins=bins)[0]
+        payment_counter.update(chunk["payment_method"].dropna())
+
+    with plt.rc_context(_THEME):
+        _AX.clear()
+        _FIG.set_size_inches(8, 4)
+        _AX.bar(bins[:-1], hist, width=np.diff(bins), align="edge")
+        _AX.set_title("Distribución del Monto de Compra (USD)")
+        _AX.set_xlabel("Monto de compra (USD)")
+        _AX.set_ylabel("Frecuencia")
+        save_figure("etl", "fig_purchase_distribution.png", fig=_FIG)
+
+        if payment_counter:
+            metodos, conteos = zip(*payment_counter.most_common())
+            _AX.clear()
+            _FIG.set_size_inches(8, 5)
+            _AX.barh(list(metodos)[::-1], list(conteos)[::-1])
+            _AX.set_title("Frecuencia de Métodos de Pago")
+            _AX.set_xlabel("Cantidad de transacciones")
+            _AX.set_ylabel("Método de pago")
+            save_figure("etl", "fig_payment_methods.png", fig=_FIG)
 
 # ----------------------------------------------------------
 # Gráficos de KPI
 # ----------------------------------------------------------
 def plot_kpis() -> None:
     """Genera visualización de la evolución mensual de ventas."""
-    sales = PROCESSED_DIR / "kpi" / "kpi_sales.csv"
+    sales = PROCESSED_DIR / "kpi" / "kpi_sales.parquet"
 
     if not sales.exists():
         logger.warning("⚠️ No se encontró el archivo de KPI de ventas.")
         return
 
-    df_sales = pd.read_csv(sales)
+    df_sales = pd.read_parquet(sales, columns=["purchase_month", "total_ventas_usd"])
 
-    # Asegurar orden cronológico de los meses
+    # purchase_month ahora es un índice entero (1-12): el orden cronológico
+    # es el orden natural, sin roundtrip por Categorical
     month_order = [
         "January", "February", "March", "April", "May", "June",
         "July", "August", "September", "October", "November", "December"
     ]
-
-    # Eliminar filas con meses no válidos o nulos
-    df_sales = df_sales[df_sales["purchase_month"].isin(month_order)]
-
-    # Asegurar dtype categórico ordenado
-    df_sales["purchase_month"] = pd.Categorical(
-        df_sales["purchase_month"],
-        categories=month_order,
-        ordered=True
-    )
-
-
-    plt.figure(figsize=(8, 4))
-    sns.lineplot(x="purchase_month", y="total_ventas_usd", data=df_sales, marker="o")
-    plt.title("Evolución Mensual de Ventas (USD)")
-    plt.xlabel("Mes")
-    plt.ylabel("Ventas Totales (USD)")
-    plt.tight_layout()
-    save_figure("kpi", "fig_sales_trend.png")
+    df_sales = df_sales[df_sales["purchase_month"].between(1, 12)]
+
+    with plt.rc_context(_THEME):
+        _AX.clear()
+        _FIG.set_size_inches(8, 4)
+        sns.lineplot(x="purchase_month", y="total_ventas_usd", data=df_sales, marker="o", ax=_AX)
+        _AX.set_xticks(range(1, 13))
+        _AX.set_xticklabels(month_order, rotation=45, ha="right")
+        _AX.set_title("Evolución Mensual de Ventas (USD)")
+        _AX.set_xlabel("Mes")
+        _AX.set_ylabel("Ventas Totales (USD)")
+        save_figure("kpi", "fig_sales_trend.png", fig=_FIG)
 
     logger.info("✅ Gráfico de KPI de ventas generado correctamente.")
 
@@ -116,28 +120,30 @@ def plot_models() -> None:
     reg = PROCESSED_DIR / "ml" / "ml_results_regression.csv"
     if reg.exists():
         df = pd.read_csv(reg)
-        plt.figure(figsize=(8, 4))
-        df["model"] = df["model"].astype("category")
-        sns.barplot(x="model", y="RMSE", data=df)
-        plt.title("Comparativa RMSE - Modelos de Regresión")
-        plt.xlabel("Modelo")
-        plt.ylabel("RMSE")
-        plt.tight_layout()
-        save_figure("models", "fig_rmse_regression.png")
+        with plt.rc_context(_THEME):
+            _AX.clear()
+            _FIG.set_size_inches(8, 4)
+            df["model"] = df["model"].astype("category")
+            sns.barplot(x="model", y="RMSE", data=df, ax=_AX)
+            _AX.set_title("Comparativa RMSE - Modelos de Regresión")
+            _AX.set_xlabel("Modelo")
+            _AX.set_ylabel("RMSE")
+            save_figure("models", "fig_rmse_regression.png", fig=_FIG)
     else:
         logger.warning("⚠️ No se encontró ml_results_regression.csv")
 
     clf = PROCESSED_DIR / "ml" / "ml_results_classification.csv"
     if clf.exists():
         df = pd.read_csv(clf)
-        plt.figure(figsize=(8, 4))
-        df["model"] = df["model"].astype("category")
-        sns.barplot(x="model", y="f1_macro", data=df)
-        plt.title("Comparativa F1 Macro - Modelos de Clasificación")
-        plt.xlabel("Modelo")
-        plt.ylabel("F1 Macro")
-        plt.tight_layout()
-        save_figure("models", "fig_f1_classification.png")
+        with plt.rc_context(_THEME):
+            _AX.clear()
+            _FIG.set_size_inches(8, 4)
+            df["model"] = df["model"].astype("category")
+            sns.barplot(x="model", y="f1_macro", data=df, ax=_AX)
+            _AX.set_title("Comparativa F1 Macro - Modelos de Clasificación")
+            _AX.set_xlabel("Modelo")
+            _AX.set_ylabel("F1 Macro")
+            save_figure("models", "fig_f1_classification.png", fig=_FIG)
     else:
         logger.warning("⚠️ No se encontró ml_results_classification.csv")
 
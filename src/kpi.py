@@ -18,10 +18,11 @@ Incluye:
 ==========================================================
 """
 
-import logging
+import os
 import pandas as pd
 from pathlib import Path
-from src.config import DATA_PROCESSED, LOGS_KPI
+from src.config import DATA_PROCESSED, LOGS_KPI, load_processed
+from src.logutil import setup_async_logger
 
 # ----------------------------------------------------------
 # Configuración general
@@ -31,27 +32,32 @@ OUTPUT_DIR = DATA_PROCESSED / "kpi"
 OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
 LOG_FILE = LOGS_KPI / "kpi_log.txt"
 
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s - [%(levelname)s] - %(message)s",
-    handlers=[
-        logging.FileHandler(LOG_FILE, mode="w", encoding="utf-8"),
-        logging.StreamHandler(),
-    ],
-)
-logger = logging.getLogger(__name__)
+logger = setup_async_logger(LOG_FILE, __name__)
+
+# Los KPIs se guardan en Parquet; exportar también CSV (p. ej. para
+# herramientas externas como Power BI) se habilita con esta variable.
+KEEP_CSV_MIRROR = os.environ.get("FASHION_DATA_KPI_CSV", "0") == "1"
+
+
+def _save_kpi(df: pd.DataFrame, output_dir: Path, name: str) -> Path:
+    """Guarda un KPI en Parquet (y opcionalmente su espejo CSV)."""
+    output_path = output_dir / f"{name}.parquet"
+    df.to_parquet(output_path, compression="zstd", index=False)
+    if KEEP_CSV_MIRROR:
+        df.to_csv(output_dir / f"{name}.csv", index=False)
+    return output_path
 
 
 # ----------------------------------------------------------
 # Funciones principales de cálculo de KPIs
 # ----------------------------------------------------------
 def load_clean_data(path: Path) -> pd.DataFrame:
-    """Carga el dataset limpio."""
-    if not path.exists():
+    """Carga el dataset limpio (Parquet si existe, CSV como respaldo)."""
+    if not path.exists() and not path.with_suffix(".parquet").exists():
         raise FileNotFoundError(f"No se encontró el dataset en {path}")
 
     logger.info("Cargando dataset limpio desde: %s", path)
-    df = pd.read_csv(path)
+    df = load_processed()
     logger.info("Dataset cargado correctamente: %d filas, %d columnas", *df.shape)
     return df
 
@@ -60,13 +66,13 @@ def generate_sales_kpi(df: pd.DataFrame, output_dir: Path) -> None:
     """Genera KPI de ventas por año, mes y segmento."""
     logger.info("Generando KPI de ventas...")
 
-    required_cols = {"purchase_year", "purchase_month", "ticket_segment"}
-    if not required_cols.issubset(df.columns):
+    keys = ["purchase_year", "purchase_month", "ticket_segment"]
+    if not set(keys).issubset(df.columns):
         logger.warning("Columnas necesarias para KPI de ventas no encontradas.")
         return
 
     kpi_sales = (
-        df.groupby(list(required_cols), as_index=False)
+        df.groupby(keys, as_index=False, sort=False, observed=True)
         .agg(
             total_ventas_usd=("purchase_amount_usd", "sum"),
             promedio_ticket_usd=("purchase_amount_usd", "mean"),
@@ -75,8 +81,7 @@ def generate_sales_kpi(df: pd.DataFrame, output_dir: Path) -> None:
         .sort_values(by=["purchase_year", "purchase_month"])
     )
 
-    output_path = output_dir / "kpi_sales.csv"
-    kpi_sales.to_csv(output_path, index=False)
+    output_path = _save_kpi(kpi_sales, output_dir, "kpi_sales")
     logger.info("KPI de ventas guardado en: %s", output_path)
 
 
@@ -89,7 +94,7 @@ def generate_payment_kpi(df: pd.DataFrame, output_dir: Path) -> None:
         return
 
     kpi_payment = (
-        df.groupby("payment_method", as_index=False)
+        df.groupby("payment_method", as_index=False, sort=False, observed=True)
         .agg(
             total_ventas_usd=("purchase_amount_usd", "sum"),
             transacciones=("payment_method", "count"),
@@ -100,8 +105,7 @@ def generate_payment_kpi(df: pd.DataFrame, output_dir: Path) -> None:
         (kpi_payment["transacciones"] / kpi_payment["transacciones"].sum()) * 100
     ).round(2)
 
-    output_path = output_dir / "kpi_payment.csv"
-    kpi_payment.to_csv(output_path, index=False)
+    output_path = _save_kpi(kpi_payment, output_dir, "kpi_payment")
     logger.info("KPI de método de pago guardado en: %s", output_path)
 
 
@@ -109,21 +113,20 @@ def generate_satisfaction_kpi(df: pd.DataFrame, output_dir: Path) -> None:
     """Genera KPI de satisfacción por mes y nivel."""
     logger.info("Generando KPI de satisfacción...")
 
-    required_cols = {"purchase_year", "purchase_month", "satisfaction_level"}
-    if not required_cols.issubset(df.columns):
+    keys = ["purchase_year", "purchase_month", "satisfaction_level"]
+    if not set(keys).issubset(df.columns):
         logger.warning("Columnas necesarias para KPI de satisfacción no encontradas.")
         return
 
     kpi_satisfaction = (
-        df.groupby(list(required_cols), as_index=False)
+        df.groupby(keys, as_index=False, sort=False, observed=True)
         .agg(
             rating_promedio=("review_rating", "mean"),
             cantidad_clientes=("review_rating", "count"),
         )
     )
 
-    output_path = output_dir / "kpi_satisfaction.csv"
-    kpi_satisfaction.to_csv(output_path, index=False)
+    output_path = _save_kpi(kpi_satisfaction, output_dir, "kpi_satisfaction")
     logger.info("KPI de satisfacción guardado en: %s", output_path)
 
 
@@ -136,7 +139,7 @@ def generate_customer_kpi(df: pd.DataFrame, output_dir: Path) -> None:
         return
 
     kpi_customer = (
-        df.groupby("customer_reference_id", as_index=False)
+        df.groupby("customer_reference_id", as_index=False, sort=False, observed=True)
         .agg(
             total_gasto_usd=("purchase_amount_usd", "sum"),
             compras=("purchase_amount_usd", "count"),
@@ -148,8 +151,7 @@ def generate_customer_kpi(df: pd.DataFrame, output_dir: Path) -> None:
         kpi_customer["total_gasto_usd"] / kpi_customer["compras"]
     ).round(2)
 
-    output_path = output_dir / "kpi_customer.csv"
-    kpi_customer.to_csv(output_path, index=False)
+    output_path = _save_kpi(kpi_customer, output_dir, "kpi_customer")
     logger.info("KPI de clientes guardado en: %s", output_path)
 
 
@@ -191,11 +193,18 @@ def run_kpi() -> None:
     """Ejecuta el pipeline completo de generación de KPIs."""
     logger.info("Iniciando generación de KPIs - Fashion Data")
 
-    if not INPUT_PATH.exists():
+    if not INPUT_PATH.exists() and not INPUT_PATH.with_suffix(".parquet").exists():
         logger.error("No se encontró el dataset limpio: %s", INPUT_PATH)
         return
 
     df = load_clean_data(INPUT_PATH)
+
+    # Claves de agrupación a category: groupby usa códigos enteros en vez
+    # de hashear strings en cada generador
+    for col in ("purchase_month", "payment_method", "satisfaction_level", "ticket_segment"):
+        if col in df.columns:
+            df[col] = df[col].astype("category")
+
     generate_sales_kpi(df, OUTPUT_DIR)
     generate_payment_kpi(df, OUTPUT_DIR)
     generate_satisfaction_kpi(df, OUTPUT_DIR)
@@ -10,39 +10,53 @@ Genera un resumen de archivos dentro del proyecto.
 ==========================================================
 """
 
-import logging
+import os
 from pathlib import Path
 from datetime import datetime
 from src.config import BASE_DIR
+from src.logutil import setup_async_logger
 
 # ----------------------------------------------------------
 # Configuración general
 # ----------------------------------------------------------
 LOG_FILE = BASE_DIR / "data" / "processed" / "listado_archivos_log.txt"
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s - [%(levelname)s] - %(message)s",
-    handlers=[
-        logging.FileHandler(LOG_FILE, mode="w", encoding="utf-8"),
-        logging.StreamHandler(),
-    ],
-)
-logger = logging.getLogger(__name__)
+logger = setup_async_logger(LOG_FILE, __name__)
 
 
 # ----------------------------------------------------------
 # Función principal
 # ----------------------------------------------------------
 def list_files(base_dir: Path = BASE_DIR) -> None:
-    """Lista recursivamente los archivos dentro de base_dir."""
+    """
+    Lista recursivamente los archivos dentro de base_dir.
+
+    Usa os.scandir (un solo stat por entrada, cacheado en DirEntry)
+    y emite una línea de log por directorio en lugar de una por
+    archivo, reduciendo syscalls y escrituras en árboles grandes.
+    """
     logger.info("Analizando estructura de: %s", base_dir)
     logger.info("=" * 80)
 
-    for path in sorted(base_dir.rglob("*")):
-        if path.is_file():
-            size_kb = path.stat().st_size / 1024
-            mod_time = datetime.fromtimestamp(path.stat().st_mtime).strftime("%Y-%m-%d %H:%M")
-            logger.info("%s | %8.1f KB | Modif: %s", path, size_kb, mod_time)
+    pending = [str(base_dir)]
+    while pending:
+        current = pending.pop()
+        lines = []
+        try:
+            with os.scandir(current) as entries:
+                for entry in sorted(entries, key=lambda e: e.path):
+                    if entry.is_dir(follow_symlinks=False):
+                        pending.append(entry.path)
+                    elif entry.is_file(follow_symlinks=False):
+                        stat = entry.stat()
+                        size_kb = stat.st_size / 1024
+                        mod_time = datetime.fromtimestamp(stat.st_mtime).strftime("%Y-%m-%d %H:%M")
+                        lines.append(f"{entry.path} | {size_kb:8.1f} KB | Modif: {mod_time}")
+        except PermissionError as e:
+            logger.warning("Sin permisos para leer %s: %s", current, e)
+            continue
+
+        if lines:
+            logger.info("\n".join(lines))
 
     logger.info("Listado completo generado correctamente en %s", LOG_FILE)
 
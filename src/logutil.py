@@ -0,0 +1,76 @@
+"""
+==========================================================
+Fashion Data - Logging Asíncrono Compartido
+Autor/a: Agustina Arrospide
+Versión: 1.0
+----------------------------------------------------------
+Centraliza la configuración de logging de los módulos del
+pipeline usando QueueHandler + QueueListener: cada logger
+encola sus registros en O(1) y un único hilo de fondo se
+encarga de escribir a archivo y consola, evitando bloqueos
+de I/O en los bucles calientes (p. ej. listar_doc).
+==========================================================
+"""
+
+import atexit
+import logging
+import multiprocessing
+import queue
+from logging.handlers import QueueHandler, QueueListener
+from pathlib import Path
+
+LOG_FORMAT = "%(asctime)s - [%(levelname)s] - %(message)s"
+
+
+def setup_async_logger(log_file: Path, name: str | None = None) -> logging.Logger:
+    """
+    Configura un logger con escritura asíncrona a archivo y consola.
+
+    Parámetros
+    ----------
+    log_file : Path
+        Ruta del archivo de log del módulo.
+    name : str | None
+        Nombre del logger (normalmente __name__ del módulo).
+
+    La configuración es idempotente: si el logger ya tiene handlers
+    (módulo re-importado, tests), se devuelve tal cual sin abrir otro
+    FileHandler ni duplicar líneas de log.
+    """
+    logger = logging.getLogger(name)
+    if logger.handlers:
+        return logger
+
+    log_queue: queue.Queue = queue.Queue(-1)
+
+    formatter = logging.Formatter(LOG_FORMAT)
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(formatter)
+    handlers: list[logging.Handler] = [stream_handler]
+
+    # Solo el proceso principal escribe a archivo: los workers de
+    # joblib/loky re-importan los módulos y, si también abrieran el
+    # mismo log en modo "w", truncarían y entrelazarían las escrituras
+    # del padre. En los workers queda únicamente la salida por consola.
+    if multiprocessing.parent_process() is None:
+        # La estructura de carpetas ahora se crea de forma perezosa, así que
+        # garantizamos la carpeta del log antes de abrir el FileHandler.
+        log_file.parent.mkdir(parents=True, exist_ok=True)
+        # delay=True: el archivo se abre (y trunca) recién en el primer
+        # registro, no al importar el módulo. Así, importar src.model
+        # (que reutiliza helpers de src.etl) no borra el log del ETL
+        # como efecto colateral del import.
+        file_handler = logging.FileHandler(
+            log_file, mode="w", encoding="utf-8", delay=True
+        )
+        file_handler.setFormatter(formatter)
+        handlers.append(file_handler)
+
+    listener = QueueListener(log_queue, *handlers)
+    listener.start()
+    atexit.register(listener.stop)
+
+    logger.setLevel(logging.INFO)
+    logger.addHandler(QueueHandler(log_queue))
+    logger.propagate = False
+    return logger